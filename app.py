@@ -1,34 +1,47 @@
 
 import io
+import re
 import numpy as np
 import pandas as pd
 import streamlit as st
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
 from statsmodels.tsa.holtwinters import ExponentialSmoothing
 import plotly.express as px
 
 st.set_page_config(page_title="Area-wise Sales Forecast", layout="wide")
 
-# Add caching for better performance
-@st.cache_data
-def read_excel_cached(file_bytes, sheet_name=None, header=None, engine="openpyxl"):
-    """Cached Excel reading function"""
-    return pd.read_excel(io.BytesIO(file_bytes), sheet_name=sheet_name, header=header, engine=engine)
+# Prefer the Rust calamine reader (xls/xlsx/xlsb); otherwise let pandas
+# pick openpyxl or xlrd from the file content
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = "calamine"
+except ImportError:
+    EXCEL_ENGINE = None
+
+# Write the report with xlsxwriter when installed, it is much faster than openpyxl
+try:
+    import xlsxwriter  # noqa: F401
+    REPORT_ENGINE = "xlsxwriter"
+except ImportError:
+    REPORT_ENGINE = "openpyxl"
 
+# Add caching for better performance
 @st.cache_data
 def process_data_cached(file_bytes, sheet_name, header_row):
     """Cached data processing function"""
     try:
-        if sheet_name.endswith('.xls'):
-            df = pd.read_excel(io.BytesIO(file_bytes), sheet_name=sheet_name, header=header_row)
-        else:
-            df = pd.read_excel(io.BytesIO(file_bytes), sheet_name=sheet_name, header=header_row, engine="openpyxl")
+        df = pd.read_excel(io.BytesIO(file_bytes), sheet_name=sheet_name, header=header_row, engine=EXCEL_ENGINE)
         return df
     except Exception as e:
         st.error(f"Error reading sheet {sheet_name}: {e}")
         return None
 
+@st.cache_data
+def load_all_sheets(file_bytes, engine=EXCEL_ENGINE):
+    """Parse the workbook once and return every sheet without a header row"""
+    xls = pd.ExcelFile(io.BytesIO(file_bytes), engine=engine)
+    return {s: xls.parse(s, header=None) for s in xls.sheet_names}
+
 # ----------------------
 # Helpers
 # ----------------------
@@ -46,6 +59,55 @@ MONTHS_MAP = {
     "feb": 2, "february": 2,
     "mar": 3, "march": 3,
 }
+# Longest spelling first so "september" is tried before "sep"
+MONTH_ITEMS = sorted(MONTHS_MAP.items(), key=lambda kv: -len(kv[0]))
+# Position of each month in the fiscal year (apr=0 .. mar=11)
+FISCAL_OFFSET = {tok: (num + 8) % 12 for tok, num in MONTHS_MAP.items()}
+
+# Month header names of the generic monthly tables
+MONTH_COLS = frozenset(["April", "May", "June", "July", "August", "September", "October", "November", "December", "January", "February", "March"])
+# Any full month name inside a cell, e.g. "April" or "SALES-MAY"
+MONTH_RE = re.compile("april|may|june|july|august|september|october|november|december|january|february|march", re.IGNORECASE)
+
+# First 4-digit year of labels like "2018-19" or "FY 2018-2019"
+FY_RE = re.compile(r'(20\d{2})')
+
+# Kerala territories (exact names as requested)
+KERALA_TERRITORIES = [
+    'TRIVANDRUM', 'NEYYATINKARA', 'KOLLAM', 'PATHANAMTHITTA', 'KOTTAYAM',
+    'ALAPPUZHA', 'IDUKKI', 'MOOVATTUPUZHA', 'ERNAMKULAM', 'PALAKKAD',
+    'THRISSUR', 'EDAPAL', 'MALAPPURAM', 'KOZHIKODE CITY', 'VADAKARA',
+    'WAYANAD', 'THALASSERY', 'KANNUR', 'KASARGOD'
+]
+# Spelling -> territory, as used in the Route Sales section
+ROUTE_TERRITORY_ALIASES = {**{t: t for t in KERALA_TERRITORIES},
+                           'TVM': 'TRIVANDRUM', 'ERNAKULAM': 'ERNAMKULAM',
+                           'KASARGODE': 'KASARGOD', 'EDAPPAL': 'EDAPAL'}
+# Spelling -> territory, as used in the DEBTORS rows
+DEBTORS_TERRITORY_ALIASES = {'NEYYATTINKARA': 'NEYYATINKARA', 'EDAPPAL': 'EDAPAL'}
+
+TERRITORY_RANK = {t: i for i, t in enumerate(KERALA_TERRITORIES)}
+
+def territory_re(aliases):
+    """Regex reporting, at every position, the best ranked spelling of aliases that starts there"""
+    words = sorted(aliases, key=lambda a: TERRITORY_RANK[aliases[a]])
+    return re.compile('(?=(' + '|'.join(map(re.escape, words)) + '))')
+
+ROUTE_TERRITORY_RE = territory_re(ROUTE_TERRITORY_ALIASES)
+
+def match_first_territory(names, aliases, pattern):
+    """Territory for each name, the first in KERALA_TERRITORIES with a spelling contained in it wins"""
+    if names.empty:
+        return pd.Series(dtype=object)
+    rank = names.str.extractall(pattern)[0].map(aliases).map(TERRITORY_RANK).groupby(level=0).min()
+    return rank.map(dict(enumerate(KERALA_TERRITORIES)))
+
+# Exact yearly sales (₹) as provided for the comparison dashboard
+DASHBOARD_YEARS = np.array(['2018-2019', '2019-2020', '2020-2021', '2021-2022', '2022-2023', '2023-2024', '2024-2025', '2025-2026'])
+ROUTE_SALES = np.array([132011864, 147473198, 195564515, 174604844, 167861540, 155908390, 144241963, 48043782], dtype=np.int32)
+MSD_SALES = np.array([60767454, 61030939, 35538503, 30756095, 46372021, 41520083, 42410753, 14184331], dtype=np.int32)
+INTER_UNIT_SALES = np.array([28080085, 26841135, 22048038, 21108102, 28564074, 29965624, 28855386, 14569952], dtype=np.int32)
+TOTAL_SALES = ROUTE_SALES + MSD_SALES + INTER_UNIT_SALES
 
 def normalize_cols(df):
     # Lowercase, strip, remove extra spaces
@@ -54,10 +116,26 @@ def normalize_cols(df):
     df.columns = [' '.join(c.split()) for c in df.columns]
     return df
 
+def frame_with_header(raw, header_row):
+    """Slice a sheet loaded with header=None as if it was read with header=header_row"""
+    # Unlike read_excel, numbers stored as text stay strings here; callers convert with pd.to_numeric
+    columns, seen = [], {}
+    for i, name in enumerate(raw.iloc[header_row]):
+        if pd.isna(name):
+            name = f"Unnamed: {i}"
+        # De-duplicate like pandas does ("April", "April.1", ...)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        columns.append(name)
+    df = raw.iloc[header_row + 1:].reset_index(drop=True)
+    df.columns = columns
+    return df.infer_objects()
+
 def convert_to_lakhs(value):
-    """Convert value from rupees to lakhs (1 lakh = 100,000 rupees)"""
-    if pd.isna(value) or value == 0:
-        return value
+    """Convert a value or a whole Series from rupees to lakhs (1 lakh = 100,000 rupees)"""
     return value / 100000
 
 def format_lakhs(value):
@@ -66,66 +144,43 @@ def format_lakhs(value):
         return "₹0"
     return f"₹{value:,.1f}L"
 
-def process_dashboard_data(uploaded):
+def process_dashboard_data(raw_df):
     """Process data for the sales comparison dashboard"""
     try:
-        # Read the comparison report sheet
-        comparison_df = pd.read_excel(uploaded, sheet_name='COMPARISON REPORT', header=6)
+        # Slice the comparison report sheet
+        comparison_df = frame_with_header(raw_df, 6)
+
+        # Year columns like 2018-2019
+        col_strs = comparison_df.columns.astype(str)
+        year_cols = comparison_df.columns[col_strs.str.contains('-', regex=False) & col_strs.str.contains(r'\d')].tolist()
+
+        def year_totals(j):
+            values = comparison_df.iloc[j][year_cols]
+            return pd.to_numeric(values[values.notna()], errors='coerce').to_dict()
+
+        particulars = comparison_df.iloc[:, 0].astype(str).str.strip().str.upper()
+        has_total = particulars.str.contains('TOTAL', regex=False)
+
+        def section_totals(is_section, is_total):
+            # Extract year totals from the first total row within 19 rows of each section header
+            totals = {}
+            total_rows = np.flatnonzero(is_total)
+            for i in np.flatnonzero(is_section):
+                k = np.searchsorted(total_rows, i + 1)
+                if k < len(total_rows) and total_rows[k] < i + 20:
+                    totals.update(year_totals(total_rows[k]))
+            return totals
 
         # Find different sales sections and extract totals directly
-        route_sales_total = {}
-        msd_sales_total = {}
-        inter_unit_total = {}
-
-        current_section = None
-
-        for i, row in comparison_df.iterrows():
-            particulars = str(row.iloc[0]).strip().upper()
-
-            if 'ROUTE SALES' in particulars:
-                current_section = 'route'
-                # Look for the total row for route sales
-                for j in range(i+1, min(i+20, len(comparison_df))):
-                    if j < len(comparison_df):
-                        next_particulars = str(comparison_df.iloc[j, 0]).strip().upper()
-                        if 'TOTAL' in next_particulars and 'ROUTE' in next_particulars:
-                            # Extract year totals
-                            year_cols = [col for col in comparison_df.columns if '-' in str(col) and any(char.isdigit() for char in str(col))]
-                            for year_col in year_cols:
-                                value = comparison_df.iloc[j][year_col]
-                                if pd.notna(value):
-                                    route_sales_total[year_col] = pd.to_numeric(value, errors='coerce')
-                            break
-
-            elif 'MSD SALES' in particulars:
-                current_section = 'msd'
-                # Look for the total row for MSD sales
-                for j in range(i+1, min(i+20, len(comparison_df))):
-                    if j < len(comparison_df):
-                        next_particulars = str(comparison_df.iloc[j, 0]).strip().upper()
-                        if 'TOTAL' in next_particulars and 'MSD' in next_particulars:
-                            # Extract year totals
-                            year_cols = [col for col in comparison_df.columns if '-' in str(col) and any(char.isdigit() for char in str(col))]
-                            for year_col in year_cols:
-                                value = comparison_df.iloc[j][year_col]
-                                if pd.notna(value):
-                                    msd_sales_total[year_col] = pd.to_numeric(value, errors='coerce')
-                            break
+        is_route = particulars.str.contains('ROUTE SALES', regex=False)
+        is_msd = ~is_route & particulars.str.contains('MSD SALES', regex=False)
+        is_inter_unit = ~is_route & ~is_msd & (particulars.str.contains('INTER UNIT', regex=False) |
+                                               particulars.str.contains('INTER-UNIT', regex=False))
 
-            elif 'INTER UNIT' in particulars or 'INTER-UNIT' in particulars:
-                current_section = 'inter_unit'
-                # Look for the total row for Inter Unit sales
-                for j in range(i+1, min(i+20, len(comparison_df))):
-                    if j < len(comparison_df):
-                        next_particulars = str(comparison_df.iloc[j, 0]).strip().upper()
-                        if 'TOTAL' in next_particulars and ('INTER' in next_particulars or 'UNIT' in next_particulars):
-                            # Extract year totals
-                            year_cols = [col for col in comparison_df.columns if '-' in str(col) and any(char.isdigit() for char in str(col))]
-                            for year_col in year_cols:
-                                value = comparison_df.iloc[j][year_col]
-                                if pd.notna(value):
-                                    inter_unit_total[year_col] = pd.to_numeric(value, errors='coerce')
-                            break
+        route_sales_total = section_totals(is_route, has_total & particulars.str.contains('ROUTE', regex=False))
+        msd_sales_total = section_totals(is_msd, has_total & particulars.str.contains('MSD', regex=False))
+        inter_unit_total = section_totals(is_inter_unit, has_total & (particulars.str.contains('INTER', regex=False) |
+                                                                      particulars.str.contains('UNIT', regex=False)))
 
         return {
             'route_sales_total': route_sales_total,
@@ -137,38 +192,21 @@ def process_dashboard_data(uploaded):
         st.error(f"Error processing dashboard data: {e}")
         return None
 
+@st.cache_data
 def create_dashboard_table(currency_format):
     """Create the dashboard table with the exact data provided"""
     try:
-        # Exact data as provided by the user
-        data = {
-            'Column1': ['ROUTE SALES', 'MSD SALES', 'INTER UNIT SALES', 'Total'],
-            '2018-2019': [132011864, 60767454, 28080085, 220859403],
-            '2019-2020': [147473198, 61030939, 26841135, 235345272],
-            '2020-2021': [195564515, 35538503, 22048038, 253151056],
-            '2021-2022': [174604844, 30756095, 21108102, 226469041],
-            '2022-2023': [167861540, 46372021, 28564074, 242797635],
-            '2023-2024': [155908390, 41520083, 29965624, 227394097],
-            '2024-2025': [144241963, 42410753, 28855386, 215508102],
-            '2025-2026': [48043782, 14184331, 14569952, 76798065]
-        }
-
-        # Create DataFrame
-        dashboard_df = pd.DataFrame(data)
-
-        # Format the values based on currency selection
-        year_columns = [col for col in dashboard_df.columns if col != 'Column1']
+        # Convert to lakhs or millions and format with commas
+        if currency_format == 'Lakhs (₹L)':
+            divisor, fmt = 100000, "{:,.0f}"
+        else:
+            divisor, fmt = 10000000, "{:,.2f}"
 
-        for col in year_columns:
-            if currency_format == 'Lakhs (₹L)':
-                # Convert to lakhs and format with commas
-                dashboard_df[col] = dashboard_df[col].apply(lambda x: f"{x/100000:,.0f}")
-            else:
-                # Convert to millions and format with commas
-                dashboard_df[col] = dashboard_df[col].apply(lambda x: f"{x/10000000:,.2f}")
+        values = np.vstack([ROUTE_SALES, MSD_SALES, INTER_UNIT_SALES, TOTAL_SALES]) / divisor
 
-        # Rename the first column
-        dashboard_df = dashboard_df.rename(columns={'Column1': 'Sales Type'})
+        dashboard_df = pd.DataFrame({'Sales Type': ['ROUTE SALES', 'MSD SALES', 'INTER UNIT SALES', 'Total']})
+        for j, year in enumerate(DASHBOARD_YEARS):
+            dashboard_df[year] = pd.Series(values[:, j]).map(fmt.format)
 
         return dashboard_df
 
@@ -176,50 +214,57 @@ def create_dashboard_table(currency_format):
         st.error(f"Error creating dashboard table: {e}")
         return None
 
+@st.cache_data
 def prepare_chart_data(sales_type, currency_format):
     """Prepare data for charts based on sales type selection using exact data"""
     try:
-        # Exact data as provided
-        years = ['2018-2019', '2019-2020', '2020-2021', '2021-2022', '2022-2023', '2023-2024', '2024-2025', '2025-2026']
-        route_sales = [132011864, 147473198, 195564515, 174604844, 167861540, 155908390, 144241963, 48043782]
-        msd_sales = [60767454, 61030939, 35538503, 30756095, 46372021, 41520083, 42410753, 14184331]
-        inter_unit_sales = [28080085, 26841135, 22048038, 21108102, 28564074, 29965624, 28855386, 14569952]
-
-        chart_data = []
+        divisor = 100000 if currency_format == 'Lakhs (₹L)' else 10000000
 
         if sales_type == 'All':
             # Create data for all sales types
-            for i, year in enumerate(years):
-                if currency_format == 'Lakhs (₹L)':
-                    chart_data.append({'Year': year, 'Sales_Category': 'Route Sales', 'Value': route_sales[i]/100000})
-                    chart_data.append({'Year': year, 'Sales_Category': 'MSD Sales', 'Value': msd_sales[i]/100000})
-                    chart_data.append({'Year': year, 'Sales_Category': 'Inter Unit Sales', 'Value': inter_unit_sales[i]/100000})
-                else:
-                    chart_data.append({'Year': year, 'Sales_Category': 'Route Sales', 'Value': route_sales[i]/10000000})
-                    chart_data.append({'Year': year, 'Sales_Category': 'MSD Sales', 'Value': msd_sales[i]/10000000})
-                    chart_data.append({'Year': year, 'Sales_Category': 'Inter Unit Sales', 'Value': inter_unit_sales[i]/10000000})
-
-        elif sales_type == 'Route Sales':
-            for i, year in enumerate(years):
-                display_value = route_sales[i]/100000 if currency_format == 'Lakhs (₹L)' else route_sales[i]/10000000
-                chart_data.append({'Year': year, 'Value': display_value})
+            categories = ['Route Sales', 'MSD Sales', 'Inter Unit Sales']
+            return pd.DataFrame({
+                'Year': np.repeat(DASHBOARD_YEARS, len(categories)),
+                'Sales_Category': np.tile(categories, len(DASHBOARD_YEARS)),
+                'Value': np.column_stack([ROUTE_SALES, MSD_SALES, INTER_UNIT_SALES]).ravel() / divisor
+            })
 
+        if sales_type == 'Route Sales':
+            sales = ROUTE_SALES
         elif sales_type == 'MSD Sales':
-            for i, year in enumerate(years):
-                display_value = msd_sales[i]/100000 if currency_format == 'Lakhs (₹L)' else msd_sales[i]/10000000
-                chart_data.append({'Year': year, 'Value': display_value})
-
+            sales = MSD_SALES
         else:  # Inter Unit Sales
-            for i, year in enumerate(years):
-                display_value = inter_unit_sales[i]/100000 if currency_format == 'Lakhs (₹L)' else inter_unit_sales[i]/10000000
-                chart_data.append({'Year': year, 'Value': display_value})
-
-        return pd.DataFrame(chart_data)
+            sales = INTER_UNIT_SALES
+        return pd.DataFrame({'Year': DASHBOARD_YEARS, 'Value': sales / divisor})
 
     except Exception as e:
         st.error(f"Error preparing chart data: {e}")
         return pd.DataFrame()
 
+@st.cache_resource(max_entries=32)
+def build_sales_figure(chart_type, sales_type, report_period, currency_format):
+    """Build the dashboard chart for the selected options, reused across reruns"""
+    chart_data = prepare_chart_data(sales_type, currency_format)
+    value_suffix = 'L' if currency_format == 'Lakhs (₹L)' else 'M'
+    plot = {'Bar Chart': px.bar, 'Line Chart': px.line}.get(chart_type, px.area)
+    options = dict(x='Year', y='Value', labels={'Value': f'Sales (₹{value_suffix})', 'Year': 'Fiscal Year'})
+    if sales_type == 'All':
+        # For "All" option, show stacked chart by sales category
+        options.update(color='Sales_Category', title=f'All Sales Types - {report_period} Report')
+        if chart_type == 'Bar Chart':
+            options['barmode'] = 'stack'
+    else:
+        options['title'] = f'{sales_type} - {report_period} Report'
+    fig = plot(chart_data, **options)
+    fig.update_layout(
+        height=400,
+        yaxis=dict(
+            tickformat=".0f",
+            ticksuffix=value_suffix
+        )
+    )
+    return fig
+
 def guess_month_cols(df):
     month_cols = []
     for c in df.columns:
@@ -228,13 +273,13 @@ def guess_month_cols(df):
         key = ' '.join(key.split())
 
         # Check for exact month matches
-        for m in MONTHS_MAP:
+        for m, _ in MONTH_ITEMS:
             if key == m or key.endswith(' '+m) or key.startswith(m+' '):
                 month_cols.append(c)
                 break
         else:
             # Check for partial matches (for columns like "April", "May", etc.)
-            for m in MONTHS_MAP:
+            for m, _ in MONTH_ITEMS:
                 if m in key and len(key) <= 15:  # Avoid matching long text
                     month_cols.append(c)
                     break
@@ -249,23 +294,21 @@ def guess_month_cols(df):
             seen.add(lc)
 
     # Sort by fiscal order Apr..Mar
-    def month_order(cname):
+    def fiscal_order(cname):
         k = str(cname).strip().lower()
         parts = k.split()
         # try last token first
         tokens = [parts[-1]] + parts[:-1]
         for t in tokens:
-            if t in MONTHS_MAP:
-                return MONTHS_MAP[t]
+            if t in FISCAL_OFFSET:
+                return FISCAL_OFFSET[t]
         # fallback - try partial match
         for m in MONTHS_MAP:
             if m in k:
-                return MONTHS_MAP[m]
-        return 13
+                return FISCAL_OFFSET[m]
+        return 12
 
-    ordered.sort(key=month_order)
-    # Reorder to Apr..Mar cycle
-    ordered = sorted(ordered, key=lambda c: (month_order(c)+8)%12)
+    ordered.sort(key=fiscal_order)
     return ordered
 
 def detect_keys(df):
@@ -284,279 +327,151 @@ def detect_keys(df):
             year = c
     return area, state, year
 
-def to_fiscal_year_start(ycol_value):
-    # Accept formats like "2018-19", "2018-2019", 2018, "FY 2018-19" etc.
-    s = str(ycol_value).strip()
-    # Try extract 4-digit year first occurrence
-    import re
-    m = re.search(r'(20\d{2})', s)
-    if m:
-        y = int(m.group(1))
-    else:
-        # fallback: if number-like convert
-        try:
-            y = int(float(s))
-            if y < 2000: y = 2000 + (y % 100)  # crude fallback
-        except:
-            y = None
-    if y is None:
-        return None
-    # Fiscal year assumed Apr..Mar, so start is April of detected y
-    return pd.Timestamp(year=y, month=4, day=1)
-
-def process_monthly_comparison_sheet(uploaded, sheet_name):
+def fiscal_start_years(values):
+    """First year of each FY label like "2018-19", 2018 or "FY 2018-19" (NaN when unknown)"""
+    s = pd.Series(values).astype(str).str.strip()
+    years = pd.to_numeric(s.str.extract(FY_RE, expand=False), errors="coerce")
+    # fallback: if number-like convert
+    fallback = np.trunc(pd.to_numeric(s, errors="coerce"))
+    fallback = fallback.where(fallback >= 2000, 2000 + fallback % 100)
+    return years.fillna(fallback)
+
+def fiscal_month_dates(fy_years, months):
+    """Calendar dates for fiscal months: Apr..Dec of FY start year, Jan..Mar of the next"""
+    fy_years = np.asarray(fy_years, dtype=np.float64)
+    months = np.asarray(months, dtype=np.int64)
+    # Months since 1970-01, NaN when the fiscal year is unknown
+    month_index = (fy_years + (months < 4) - 1970) * 12 + (months - 1)
+    known = ~np.isnan(month_index)
+    dates = np.full(month_index.shape, np.datetime64("NaT"), dtype="datetime64[M]")
+    dates[known] = month_index[known].astype(np.int64).astype("datetime64[M]")
+    return dates.astype("datetime64[ns]")
+
+def melt_month_cells(rows, month_cols, sheet_name):
+    """Long-format records for every non-zero month cell of rows tagged with Area, State and FY"""
+    long = rows.melt(id_vars=["Area", "State", "FY"], value_vars=month_cols,
+                     var_name="MonthName", value_name="Value")
+    # melt stacks one block of rows per month column
+    months = np.repeat(np.array([MONTHS_MAP[c.lower()] for c in month_cols], dtype=np.int8), len(rows))
+    # Numbers stored as text count as numbers, so a text "0" is dropped like a 0
+    sales = pd.to_numeric(long["Value"], errors="coerce").astype("float64")
+    keep = (sales.notna() & (sales != 0)).to_numpy()
+    long, months, sales = long[keep], months[keep], sales[keep]
+    return pd.DataFrame({
+        "Area": long["Area"],
+        "State": long["State"],
+        "FY": long["FY"],
+        "MonthName": long["MonthName"],
+        "Date": fiscal_month_dates(fiscal_start_years(long["FY"]), months),
+        "Month": months,
+        "Sales": sales,
+        "SourceSheet": sheet_name
+    })
+
+def match_first_pattern(names, patterns):
+    """Pattern for each name, the first pattern contained in it wins"""
+    matched = pd.Series(None, index=names.index, dtype=object)
+    for pattern in reversed(patterns):
+        matched = matched.mask(names.str.contains(pattern, regex=False), pattern)
+    return matched
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def process_monthly_comparison_sheet(file_bytes, sheet_name):
     """Process Monthly Comparison sheets with area-wise data blocks."""
     try:
-        # Read the sheet with header at row 8 (where months are)
-        if uploaded.name.endswith('.xls'):
-            df = pd.read_excel(uploaded, sheet_name=sheet_name, header=8)
-        else:
-            df = pd.read_excel(uploaded, sheet_name=sheet_name, header=8, engine="openpyxl")
+        # Slice the sheet with header at row 8 (where months are)
+        df = frame_with_header(load_all_sheets(file_bytes)[sheet_name], 8)
 
         # Define area patterns to look for
         area_patterns = ['KERALA', 'KARNATAKA', 'TAMIL NADU', 'OTHER STATES', 'MSD INSIDE KERALA', 'MSD OUTSIDE KERALA']
 
-        all_data = []
-        current_area = "KERALA"  # First section is typically Kerala
-
         # Month columns (excluding YEAR and TOTAL)
         month_cols = ['APRIL', 'MAY', 'JUNE', 'JULY', 'AUGUST', 'SEPTEMBER',
                      'OCTOBER', 'NOVEMBER', 'DECEMBER', 'JANUARY', 'FEBRUARY', 'MARCH']
+        month_cols = [c for c in month_cols if c in df.columns]
 
-        for i, row in df.iterrows():
-            first_val = str(row.iloc[0]).strip().upper()
+        first_val = df.iloc[:, 0].astype(str).str.strip().str.upper()
 
-            # Check if this row indicates a new area
-            for area in area_patterns:
-                if area in first_val:
-                    current_area = area
-                    break
+        # Rows naming an area start a new section; first section is typically Kerala
+        current_area = match_first_pattern(first_val, area_patterns).ffill().fillna("KERALA")
 
-            # Check if this row contains year data (like 2018-2019, 2019-2020, etc.)
-            if '-' in first_val and any(char.isdigit() for char in first_val):
-                year = first_val
-
-                # Extract monthly data for this year and area
-                for month_col in month_cols:
-                    if month_col in df.columns:
-                        value = row[month_col]
-                        if pd.notna(value) and value != 0:
-                            # Convert month name to number
-                            month_num = MONTHS_MAP.get(month_col.lower(), None)
-                            if month_num:
-                                # Create fiscal year date
-                                fy_start = to_fiscal_year_start(year)
-                                if fy_start:
-                                    if month_num >= 4:
-                                        dt = pd.Timestamp(year=fy_start.year, month=month_num, day=1)
-                                    else:
-                                        dt = pd.Timestamp(year=fy_start.year + 1, month=month_num, day=1)
-                                else:
-                                    dt = pd.NaT
-
-                                all_data.append({
-                                    "Area": current_area,
-                                    "State": current_area if current_area in ['KERALA', 'KARNATAKA', 'TAMIL NADU'] else None,
-                                    "FY": year,
-                                    "MonthName": month_col,
-                                    "Date": dt,
-                                    "Month": month_num,
-                                    "Sales": pd.to_numeric(value, errors="coerce"),
-                                    "SourceSheet": sheet_name
-                                })
-
-        if all_data:
-            result_df = pd.DataFrame(all_data)
-            result_df = result_df.dropna(subset=["Sales"])
-            return [result_df]
-        else:
-            return []
+        # Rows containing year data (like 2018-2019, 2019-2020, etc.)
+        year_mask = first_val.str.contains('-', regex=False) & first_val.str.contains(r'\d')
+        if not year_mask.any():
+            return pd.DataFrame()
+
+        area = current_area[year_mask]
+        rows = df.loc[year_mask, month_cols].assign(
+            Area=area,
+            State=area.where(area.isin(['KERALA', 'KARNATAKA', 'TAMIL NADU']), None),
+            FY=first_val[year_mask]
+        )
+        return melt_month_cells(rows, month_cols, sheet_name)
 
     except Exception as e:
         st.error(f"Error processing {sheet_name}: {e}")
-        return []
+        return pd.DataFrame()
 
-def process_territory_data_from_yearly_sheets(uploaded, sheet_name):
+@st.cache_data(max_entries=64, show_spinner=False)
+def process_territory_data_from_yearly_sheets(file_bytes, sheet_name):
     """Process yearly sheets to extract territory-level data."""
-
-    # Define the Kerala territories (exact names as requested)
-    kerala_territories = [
-        'TRIVANDRUM', 'NEYYATINKARA', 'KOLLAM', 'PATHANAMTHITTA', 'KOTTAYAM',
-        'ALAPPUZHA', 'IDUKKI', 'MOOVATTUPUZHA', 'ERNAMKULAM', 'PALAKKAD',
-        'THRISSUR', 'EDAPAL', 'MALAPPURAM', 'KOZHIKODE CITY', 'VADAKARA',
-        'WAYANAD', 'THALASSERY', 'KANNUR', 'KASARGOD'
-    ]
-
     try:
-        # Read the sheet with header at row 6 (where months are)
-        if uploaded.name.endswith('.xls'):
-            df = pd.read_excel(uploaded, sheet_name=sheet_name, header=6)
-        else:
-            df = pd.read_excel(uploaded, sheet_name=sheet_name, header=6, engine="openpyxl")
-
-        all_data = []
+        # Slice the sheet with header at row 6 (where months are)
+        df = frame_with_header(load_all_sheets(file_bytes)[sheet_name], 6)
 
         # Month columns (use the actual column names from the Excel)
         month_cols = ['April', 'May', 'June', 'July', 'August', 'September',
                      'October', 'November', 'December', 'January', 'February', 'March']
+        month_cols = [c for c in month_cols if c in df.columns]
 
         # Extract fiscal year from sheet name
         fiscal_year = sheet_name
 
-        # Find Route Sales section first
-        route_sales_start = None
-        for i, row in df.iterrows():
-            particulars = str(row.iloc[0]).strip().upper()
-            if 'ROUTE SALES' in particulars:
-                route_sales_start = i
-                break
-
-        if route_sales_start is None:
-            return []
+        particulars = df.iloc[:, 0]
+        area_name = particulars.astype(str).str.strip().str.upper()
 
-        # Process Route Sales section to find territory data
-        for i in range(route_sales_start + 1, min(route_sales_start + 100, len(df))):
-            if i >= len(df):
-                break
-
-            area_name = str(df.iloc[i, 0]).strip().upper()
-
-            # Skip empty rows and section headers
-            if pd.isna(df.iloc[i, 0]) or area_name in ['NAN', '', 'TOTAL', 'INSIDE KERALA', 'CENTRAL ZONE', 'NORTH ZONE', 'SOUTH ZONE']:
-                continue
-
-            # Extract Kerala territory name
-            territory_name = None
-            for kerala_territory in kerala_territories:
-                # Check for exact matches or aliases
-                if kerala_territory == 'TRIVANDRUM' and any(alias in area_name for alias in ['TRIVANDRUM', 'TVM']):
-                    territory_name = kerala_territory
-                    break
-                elif kerala_territory == 'ERNAMKULAM' and 'ERNAKULAM' in area_name:
-                    territory_name = kerala_territory
-                    break
-                elif kerala_territory == 'KASARGOD' and 'KASARGODE' in area_name:
-                    territory_name = kerala_territory
-                    break
-                elif kerala_territory == 'EDAPAL' and 'EDAPPAL' in area_name:
-                    territory_name = kerala_territory
-                    break
-                elif kerala_territory in area_name:
-                    territory_name = kerala_territory
-                    break
-
-            if territory_name:
-                # Extract monthly data for this territory
-                for month_col in month_cols:
-                    if month_col in df.columns:
-                        value = df.iloc[i][month_col]
-                        if pd.notna(value) and value != 0:
-                            try:
-                                # Convert month name to number
-                                month_num = MONTHS_MAP.get(month_col.lower(), None)
-                                if month_num:
-                                    # Create fiscal year date
-                                    fy_start = to_fiscal_year_start(fiscal_year)
-                                    if fy_start:
-                                        if month_num >= 4:
-                                            dt = pd.Timestamp(year=fy_start.year, month=month_num, day=1)
-                                        else:
-                                            dt = pd.Timestamp(year=fy_start.year + 1, month=month_num, day=1)
-                                    else:
-                                        dt = pd.NaT
-
-                                    all_data.append({
-                                        "Area": territory_name,
-                                        "State": "KERALA",
-                                        "FY": fiscal_year,
-                                        "MonthName": month_col,
-                                        "Date": dt,
-                                        "Month": month_num,
-                                        "Sales": pd.to_numeric(value, errors="coerce"),
-                                        "SourceSheet": sheet_name
-                                    })
-                            except:
-                                continue
+        # Find Route Sales section first
+        route_hits = np.flatnonzero(area_name.str.contains('ROUTE SALES', regex=False))
+        if len(route_hits) == 0:
+            return pd.DataFrame()
+        route_sales_start = route_hits[0]
+
+        # Process Route Sales section to find territory data,
+        # skipping empty rows and section headers
+        pos = np.arange(len(df))
+        in_section = (pos > route_sales_start) & (pos < route_sales_start + 100)
+        skip = particulars.isna() | area_name.isin(['NAN', '', 'TOTAL', 'INSIDE KERALA', 'CENTRAL ZONE', 'NORTH ZONE', 'SOUTH ZONE'])
+        candidates = area_name[in_section & ~skip.to_numpy()]
+        territory_name = match_first_territory(candidates, ROUTE_TERRITORY_ALIASES, ROUTE_TERRITORY_RE)
+
+        rows = df.loc[territory_name.index, month_cols].assign(Area=territory_name, State="KERALA", FY=fiscal_year)
+        parts = [melt_month_cells(rows, month_cols, sheet_name)]
 
         # Also search in DEBTORS section for missing territories (like NEYYATTINKARA)
-        missing_territories = set(kerala_territories) - set([d['Area'] for d in all_data])
+        found = set(parts[0]["Area"])
+        missing_territories = [t for t in KERALA_TERRITORIES if t not in found]
         if missing_territories:
-
             # Search entire sheet for missing territories
-            for i, row in df.iterrows():
-                area_name = str(row.iloc[0]).strip().upper()
+            aliases = {t: t for t in missing_territories}
+            aliases.update({a: t for a, t in DEBTORS_TERRITORY_ALIASES.items() if t in aliases})
+            candidates = area_name[particulars.notna() & ~area_name.isin(['NAN', 'PARTICULARS'])]
+            territory_name = match_first_territory(candidates, aliases, territory_re(aliases))
 
-                # Skip empty rows
-                if pd.isna(row.iloc[0]) or area_name in ['NAN', 'PARTICULARS']:
-                    continue
+            rows = df.loc[territory_name.index, month_cols].assign(Area=territory_name, State="KERALA", FY=fiscal_year)
+            parts.append(melt_month_cells(rows, month_cols, sheet_name))
 
-                # Check for missing territories in DEBTORS format
-                territory_name = None
-                for missing_territory in missing_territories:
-                    if missing_territory == 'NEYYATINKARA' and 'NEYYATTINKARA' in area_name:
-                        territory_name = 'NEYYATINKARA'
-                        break
-                    elif missing_territory == 'EDAPAL' and 'EDAPPAL' in area_name:
-                        territory_name = 'EDAPAL'
-                        break
-                    elif missing_territory in area_name:
-                        territory_name = missing_territory
-                        break
-
-                if territory_name:
-                    # Extract monthly data for this territory
-                    for month_col in month_cols:
-                        if month_col in df.columns:
-                            value = row[month_col]
-                            if pd.notna(value) and value != 0:
-                                try:
-                                    # Convert month name to number
-                                    month_num = MONTHS_MAP.get(month_col.lower(), None)
-                                    if month_num:
-                                        # Create fiscal year date
-                                        fy_start = to_fiscal_year_start(fiscal_year)
-                                        if fy_start:
-                                            if month_num >= 4:
-                                                dt = pd.Timestamp(year=fy_start.year, month=month_num, day=1)
-                                            else:
-                                                dt = pd.Timestamp(year=fy_start.year + 1, month=month_num, day=1)
-                                        else:
-                                            dt = pd.NaT
-
-                                        all_data.append({
-                                            "Area": territory_name,
-                                            "State": "KERALA",
-                                            "FY": fiscal_year,
-                                            "MonthName": month_col,
-                                            "Date": dt,
-                                            "Month": month_num,
-                                            "Sales": pd.to_numeric(value, errors="coerce"),
-                                            "SourceSheet": sheet_name
-                                        })
-                                except:
-                                    continue
-
-        if all_data:
-            result_df = pd.DataFrame(all_data)
-            result_df = result_df.dropna(subset=["Sales"])
-            return [result_df]
-        else:
-            return []
+        return pd.concat(parts, ignore_index=True)
 
     except Exception as e:
         st.error(f"Error processing {sheet_name}: {e}")
-        return []
+        return pd.DataFrame()
 
-def process_comparison_report_sheet(uploaded, sheet_name):
+@st.cache_data(max_entries=64, show_spinner=False)
+def process_comparison_report_sheet(file_bytes, sheet_name):
     """Process Comparison Report sheet with yearly data across areas."""
     try:
-        # Read the sheet with header at row 6 (where years are)
-        if uploaded.name.endswith('.xls'):
-            df = pd.read_excel(uploaded, sheet_name=sheet_name, header=6)
-        else:
-            df = pd.read_excel(uploaded, sheet_name=sheet_name, header=6, engine="openpyxl")
-
-        all_data = []
+        # Slice the sheet with header at row 6 (where years are)
+        df = frame_with_header(load_all_sheets(file_bytes)[sheet_name], 6)
 
         # The years are in columns 1-8 (2018-2019, 2019-2020, etc.)
         year_columns = []
@@ -580,122 +495,84 @@ def process_comparison_report_sheet(uploaded, sheet_name):
 
         month_num = MONTHS_MAP.get(current_month.lower(), 7)
 
-
-        # Process each row that contains area data
-        for i, row in df.iterrows():
-            area_name = str(row.iloc[0]).strip()
-
-            # Skip empty rows or header rows
-            if pd.isna(row.iloc[0]) or area_name in ['NaN', 'ROUTE SALES', 'Particulars']:
-                continue
-
-            # Clean up area name
-            if area_name.startswith('Debtors - '):
-                area_name = area_name.replace('Debtors - ', '').strip()
-
-            # Extract data for each year
-            for year_col in year_columns:
-                value = row[year_col]
-                if pd.notna(value) and value != 0:
-                    try:
-                        # Create fiscal year date
-                        fy_start = to_fiscal_year_start(year_col)
-                        if fy_start:
-                            if month_num >= 4:
-                                dt = pd.Timestamp(year=fy_start.year, month=month_num, day=1)
-                            else:
-                                dt = pd.Timestamp(year=fy_start.year + 1, month=month_num, day=1)
-                        else:
-                            dt = pd.NaT
-
-                        all_data.append({
-                            "Area": area_name,
-                            "State": None,
-                            "FY": year_col,
-                            "MonthName": current_month,
-                            "Date": dt,
-                            "Month": month_num,
-                            "Sales": pd.to_numeric(value, errors="coerce"),
-                            "SourceSheet": sheet_name
-                        })
-                    except:
-                        continue
-
-        if all_data:
-            result_df = pd.DataFrame(all_data)
-            result_df = result_df.dropna(subset=["Sales"])
-            return [result_df]
-        else:
-            return []
+        # Area names from the first column, normalized once
+        first_col = df.iloc[:, 0]
+        area_name = first_col.astype(str).str.strip()
+        # Skip empty rows or header rows
+        area_rows = first_col.notna() & ~area_name.isin(['NaN', 'ROUTE SALES', 'Particulars'])
+        # Clean up area name
+        is_debtors = area_name.str.startswith('Debtors - ')
+        area_name = area_name.mask(is_debtors, area_name.str.replace('Debtors - ', '', regex=False).str.strip())
+
+        # One record per non-zero year cell of every area row
+        long = df.loc[area_rows, year_columns].assign(Area=area_name[area_rows]).melt(
+            id_vars="Area", value_vars=year_columns, var_name="FY", value_name="Value")
+        # Numbers stored as text count as numbers, so a text "0" is dropped like a 0
+        long["Sales"] = pd.to_numeric(long["Value"], errors="coerce").astype("float64")
+        long = long[long["Sales"].notna() & (long["Sales"] != 0)]
+        if long.empty:
+            return pd.DataFrame()
+
+        result_df = pd.DataFrame({
+            "Area": long["Area"],
+            "State": None,
+            "FY": long["FY"],
+            "MonthName": current_month,
+            "Date": fiscal_month_dates(fiscal_start_years(long["FY"]), np.full(len(long), month_num)),
+            "Month": np.int8(month_num),
+            "Sales": long["Sales"],
+            "SourceSheet": sheet_name
+        })
+        return result_df
 
     except Exception as e:
         st.error(f"Error processing {sheet_name}: {e}")
-        return []
+        return pd.DataFrame()
 
 def long_from_wide(df, area_col, state_col, year_col, month_cols):
-    parts = []
-    for _, row in df.iterrows():
-        fy_start = to_fiscal_year_start(row[year_col]) if year_col else None
-        # If year missing, we will not set date; will handle later
-        for mcol in month_cols:
-            val = row[mcol]
-            # find month number for this column
-            mkey = mcol.strip().lower().split()[-1]
-            if mkey not in MONTHS_MAP:
-                # try fallback: any token
-                found = None
-                for tok in mcol.strip().lower().split():
-                    if tok in MONTHS_MAP:
-                        found = MONTHS_MAP[tok]; break
-                if not found:
-                    continue
-                mnum = found
-            else:
-                mnum = MONTHS_MAP[mkey]
-            # Build calendar date; if fiscal year start is known: April maps to month 4 in fy_start.year
-            if fy_start is not None:
-                # months Apr..Dec of Y, Jan..Mar of Y+1
-                if mnum >= 4:
-                    y = fy_start.year
-                else:
-                    y = fy_start.year + 1
-                dt = pd.Timestamp(year=y, month=mnum, day=1)
-            else:
-                # fallback to 1st of month in an arbitrary year, will sort later
-                dt = pd.NaT
-            parts.append({
-                "Area": row[area_col] if area_col else "All",
-                "State": row[state_col] if state_col else None,
-                "FY": row[year_col] if year_col else None,
-                "MonthName": mcol,
-                "Date": dt,
-                "Month": mnum,
-                "Sales": pd.to_numeric(val, errors="coerce")
-            })
-    long = pd.DataFrame(parts)
-    long = long.dropna(subset=["Sales"])
-    # If Date missing, try to infer by ordering within FY
-    if long["Date"].isna().any() and year_col:
-        long["FY_start"] = long["FY"].apply(to_fiscal_year_start)
-        def build_date(r):
-            if pd.isna(r["Date"]) and pd.notna(r["FY_start"]):
-                if r["Month"] >= 4:
-                    y = r["FY_start"].year
-                else:
-                    y = r["FY_start"].year + 1
-                return pd.Timestamp(year=y, month=int(r["Month"]), day=1)
-            return r["Date"]
-        long["Date"] = long.apply(build_date, axis=1)
-        long = long.drop(columns=["FY_start"])
-    return long
-
-def fit_forecast(ts, horizon):
-    # Handle degenerate series
-    if ts.dropna().sum() == 0 or ts.dropna().nunique() <= 1:
-        # naïve repeat or zeros
-        last = ts.dropna().iloc[-1] if ts.dropna().size else 0.0
+    # Resolve the month number of each month column once
+    month_num_map = {}
+    for mcol in month_cols:
+        tokens = mcol.strip().lower().split()
+        # try last token first, then any token
+        for tok in [tokens[-1]] + tokens:
+            if tok in MONTHS_MAP:
+                month_num_map[mcol] = MONTHS_MAP[tok]
+                break
+    month_cols = [c for c in month_cols if c in month_num_map]
+
+    id_cols = [c for c in [area_col, state_col, year_col] if c]
+    long = df[id_cols + month_cols].melt(id_vars=id_cols, value_vars=month_cols,
+                                         var_name="MonthName", value_name="Sales")
+    # melt stacks one block of rows per month column
+    months = np.repeat(np.array([month_num_map[c] for c in month_cols], dtype=np.int8), len(df))
+    # If year missing, Date stays NaT
+    fy_years = fiscal_start_years(long[year_col]) if year_col else pd.Series(np.nan, index=long.index)
+
+    long = pd.DataFrame({
+        "Area": long[area_col] if area_col else "All",
+        "State": long[state_col] if state_col else None,
+        "FY": long[year_col] if year_col else None,
+        "MonthName": long["MonthName"],
+        "Date": fiscal_month_dates(fy_years, months),
+        "Month": months,
+        "Sales": pd.to_numeric(long["Sales"], errors="coerce"),
+    })
+    return long.dropna(subset=["Sales"])
+
+def fit_forecast(ts, horizon, fc_index=None):
+    # Forecast months follow the last observed month unless given
+    if fc_index is None:
         start_date = ts.index[-1] if len(ts.index) > 0 else pd.Timestamp.now()
-        fc = pd.Series([last]*horizon, index=pd.date_range(start_date+pd.offsets.MonthBegin(), periods=horizon, freq="MS"))
+        fc_index = pd.date_range(start_date + pd.offsets.MonthBegin(), periods=horizon, freq="MS")
+
+    # Handle degenerate series: empty, summing to zero or constant
+    clean = ts.to_numpy(dtype=np.float64)
+    clean = clean[~np.isnan(clean)]
+    if clean.size == 0 or clean.sum() == 0 or clean.min() == clean.max():
+        # naïve repeat or zeros
+        last = clean[-1] if clean.size else 0.0
+        fc = pd.Series([last]*horizon, index=fc_index)
         return fc, None
 
     # Choose seasonal mode
@@ -709,56 +586,59 @@ def fit_forecast(ts, horizon):
             seasonal_periods=12,
             initialization_method="estimated"
         ).fit(optimized=True, use_brute=True)
-        fc_index = pd.date_range(ts.index[-1] + pd.offsets.MonthBegin(), periods=horizon, freq="MS")
         forecast = pd.Series(model.forecast(horizon), index=fc_index)
         return forecast, model
     except Exception as e:
         # fallback: seasonal naive (last year same month)
-        fc_index = pd.date_range(ts.index[-1] + pd.offsets.MonthBegin(), periods=horizon, freq="MS")
-        forecast_vals = []
-        for i, dt in enumerate(fc_index, start=1):
-            same_month_last_year = dt - relativedelta(years=1)
-            val = ts.get(same_month_last_year, np.nan)
-            if np.isnan(val):
-                val = ts.iloc[-12] if len(ts) >= 12 else ts.iloc[-1]
-            forecast_vals.append(val)
+        same_month_last_year = ts.reindex(fc_index - pd.DateOffset(years=1)).to_numpy()
+        fallback = ts.iloc[-12] if len(ts) >= 12 else ts.iloc[-1]
+        forecast_vals = np.where(np.isnan(same_month_last_year), fallback, same_month_last_year)
         return pd.Series(forecast_vals, index=fc_index), None
 
+def forecast_group(g, ts, horizon, fc_index):
+    """Forecast one group's monthly series over fc_index and return (group, forecast frame)"""
+    fc, _ = fit_forecast(ts, horizon, fc_index)
+    return g, pd.DataFrame({"Date": fc_index, "Forecast": fc.to_numpy()})
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def forecast_groups(grp, horizon, key_col="GroupKey", value_col="Sales_Lakhs"):
+    """Forecast every series of a long (key, Date, value) frame and return {key: forecast frame}"""
+    # One monthly column per group
+    wide = grp.pivot(index="Date", columns=key_col, values=value_col).asfreq("MS")
+    series = []
+    for g in wide.columns:
+        # Each group spans its own first..last month; forward fill missing months
+        ts = wide[g]
+        series.append((g, ts.loc[ts.first_valid_index():ts.last_valid_index()].ffill()))
+    # Groups ending in the same month share one forecast index
+    fc_indexes = {}
+    for g, ts in series:
+        end = ts.index[-1]
+        if end not in fc_indexes:
+            fc_indexes[end] = pd.date_range(end + pd.offsets.MonthBegin(), periods=horizon, freq="MS")
+    # Fit one after another: all groups together take under a second, far less than
+    # starting worker processes that each import pandas and statsmodels
+    return dict(forecast_group(g, ts, horizon, fc_indexes[ts.index[-1]]) for g, ts in series)
+
 def make_report(all_forecasts, hist_long, horizon=3, profit_margin=15.0):
     # Combine into one Excel-like buffer
     output = io.BytesIO()
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+    with pd.ExcelWriter(output, engine=REPORT_ENGINE) as writer:
         # Forecast Target For Areas (Enhanced Report)
-        target_rows = []
-        month_names = ["January", "February", "March", "April", "May", "June",
-                      "July", "August", "September", "October", "November", "December"]
-
-        for area, df_fc in all_forecasts.items():
-            if len(df_fc) > 0:
-                # Get the first date for this area
-                start_date = df_fc.iloc[0]["Date"]
-
-                # Create row with area and date
-                row = {"Area": area, "Date": start_date}
-
-                # Add target columns for each month in horizon
-                for i in range(min(horizon, len(df_fc))):
-                    forecast_value = df_fc.iloc[i]["Forecast"]
-                    # Apply profit margin to get target
-                    target_value = forecast_value * (1 + profit_margin / 100)
-
-                    # Get month name for column header
-                    month_date = df_fc.iloc[i]["Date"]
-                    month_name = month_names[month_date.month - 1]
-                    column_name = f"{month_name} Target"
-
-                    row[column_name] = round(target_value, 2)
-
-                target_rows.append(row)
-
-        if target_rows:
-            targets_df = pd.DataFrame(target_rows).sort_values("Area")
-            targets_df.to_excel(writer, sheet_name="Forecast Target For Areas", index=False)
+        # Every area's forecast rows, tagged with the area and the step in the horizon
+        forecasts = pd.concat(all_forecasts, names=["Area", "Step"]).reset_index() if all_forecasts else pd.DataFrame()
+        if not forecasts.empty:
+            # First forecast date of each area
+            start_dates = forecasts.groupby("Area", sort=False)["Date"].first()
+            steps = forecasts[forecasts["Step"] < horizon]
+            # Apply profit margin to get target, one "<Month> Target" column per month in horizon
+            target_cols = steps["Date"].dt.month_name() + " Target"
+            targets = (steps.assign(Column=target_cols, Target=(steps["Forecast"] * (1 + profit_margin / 100)).round(2))
+                       .drop_duplicates(["Area", "Column"], keep="last")
+                       .pivot(index="Area", columns="Column", values="Target")
+                       .reindex(columns=target_cols.unique()))
+            targets_df = pd.concat([start_dates.rename("Date"), targets], axis=1).rename_axis("Area").reset_index()
+            targets_df.sort_values("Area").to_excel(writer, sheet_name="Forecast Target For Areas", index=False)
 
         # Summary
         summary_rows = []
@@ -768,13 +648,8 @@ def make_report(all_forecasts, hist_long, horizon=3, profit_margin=15.0):
         pd.DataFrame(summary_rows).sort_values("Area").to_excel(writer, sheet_name="Summary", index=False)
 
         # Per-area forecast
-        combined = []
-        for area, df_fc in all_forecasts.items():
-            tmp = df_fc.copy()
-            tmp.insert(0, "Area", area)
-            combined.append(tmp)
-        if combined:
-            pd.concat(combined, ignore_index=True).to_excel(writer, sheet_name="Area_Forecast", index=False)
+        if all_forecasts:
+            forecasts.drop(columns="Step").to_excel(writer, sheet_name="Area_Forecast", index=False)
 
         # Historical detail
         hist_long.to_excel(writer, sheet_name="Historical_Long", index=False)
@@ -887,70 +762,7 @@ if uploaded is not None:
 
         with col1:
             # Create chart based on selection
-            if sales_type == 'All':
-                # For "All" option, show stacked chart by sales category
-                if chart_type == 'Bar Chart':
-                    fig = px.bar(
-                        chart_data,
-                        x='Year',
-                        y='Value',
-                        color='Sales_Category',
-                        title=f'All Sales Types - {report_period} Report',
-                        labels={'Value': f'Sales (₹{value_suffix})', 'Year': 'Fiscal Year'},
-                        barmode='stack'
-                    )
-                elif chart_type == 'Line Chart':
-                    fig = px.line(
-                        chart_data,
-                        x='Year',
-                        y='Value',
-                        color='Sales_Category',
-                        title=f'All Sales Types - {report_period} Report',
-                        labels={'Value': f'Sales (₹{value_suffix})', 'Year': 'Fiscal Year'}
-                    )
-                else:  # Area Chart
-                    fig = px.area(
-                        chart_data,
-                        x='Year',
-                        y='Value',
-                        color='Sales_Category',
-                        title=f'All Sales Types - {report_period} Report',
-                        labels={'Value': f'Sales (₹{value_suffix})', 'Year': 'Fiscal Year'}
-                    )
-            else:
-                # For individual sales types
-                if chart_type == 'Bar Chart':
-                    fig = px.bar(
-                        chart_data,
-                        x='Year',
-                        y='Value',
-                        title=f'{sales_type} - {report_period} Report',
-                        labels={'Value': f'Sales (₹{value_suffix})', 'Year': 'Fiscal Year'}
-                    )
-                elif chart_type == 'Line Chart':
-                    fig = px.line(
-                        chart_data,
-                        x='Year',
-                        y='Value',
-                        title=f'{sales_type} - {report_period} Report',
-                        labels={'Value': f'Sales (₹{value_suffix})', 'Year': 'Fiscal Year'}
-                    )
-                else:  # Area Chart
-                    fig = px.area(
-                        chart_data,
-                        x='Year',
-                        y='Value',
-                        title=f'{sales_type} - {report_period} Report',
-                        labels={'Value': f'Sales (₹{value_suffix})', 'Year': 'Fiscal Year'}
-                    )
-
-            fig.update_layout(
-                height=400,
-                yaxis=dict(
-                    tickformat=".0f",
-                    ticksuffix=value_suffix
-                )
-            )
+            fig = build_sales_figure(chart_type, sales_type, report_period, currency_format)
             st.plotly_chart(fig, use_container_width=True)
 
         with col2:
@@ -1046,10 +858,7 @@ if uploaded is not None:
 
     # Show progress indicator
     with st.spinner('Processing Excel file...'):
-        try:
-            raw = read_excel_cached(file_bytes, sheet_name=None, engine="openpyxl")
-        except Exception:
-            raw = read_excel_cached(file_bytes, sheet_name=None)  # fallback for .xls
+        raw = load_all_sheets(file_bytes)
 
     all_long = []
 
@@ -1065,23 +874,23 @@ if uploaded is not None:
 
         # Special handling for Monthly Comparison sheets
         if 'MONTHLY COMPARISON' in sheet_name.upper():
-            processed_data = process_monthly_comparison_sheet(uploaded, sheet_name)
-            if processed_data:
-                all_long.extend(processed_data)
+            processed_data = process_monthly_comparison_sheet(file_bytes, sheet_name)
+            if not processed_data.empty:
+                all_long.append(processed_data)
             continue
 
         # Special handling for Comparison Report sheet
         if 'COMPARISON REPORT' in sheet_name.upper():
-            processed_data = process_comparison_report_sheet(uploaded, sheet_name)
-            if processed_data:
-                all_long.extend(processed_data)
+            processed_data = process_comparison_report_sheet(file_bytes, sheet_name)
+            if not processed_data.empty:
+                all_long.append(processed_data)
             continue
 
         # Special handling for yearly sheets with territory data
         if any(char.isdigit() for char in sheet_name) and '-' in sheet_name:
-            processed_data = process_territory_data_from_yearly_sheets(uploaded, sheet_name)
-            if processed_data:
-                all_long.extend(processed_data)
+            processed_data = process_territory_data_from_yearly_sheets(file_bytes, sheet_name)
+            if not processed_data.empty:
+                all_long.append(processed_data)
             continue
 
         # Try to find the actual data table by looking for month patterns in rows
@@ -1095,18 +904,11 @@ if uploaded is not None:
                 continue
 
             try:
-                # Read with specific header row
-                if uploaded.name.endswith('.xls'):
-                    df_test = pd.read_excel(uploaded, sheet_name=sheet_name, header=header_row)
-                else:
-                    df_test = pd.read_excel(uploaded, sheet_name=sheet_name, header=header_row, engine="openpyxl")
+                # Slice the already parsed sheet at this header row
+                df_test = frame_with_header(df, header_row)
 
                 # Check if we have month columns in the actual data
-                month_cols_found = []
-                expected_months = ["April", "May", "June", "July", "August", "September", "October", "November", "December", "January", "February", "March"]
-                for col in df_test.columns:
-                    if col in expected_months:
-                        month_cols_found.append(col)
+                month_cols_found = MONTH_COLS.intersection(df_test.columns)
 
                 if len(month_cols_found) >= 8:  # Found at least 8 month columns
                     df_processed = df_test
@@ -1117,34 +919,21 @@ if uploaded is not None:
 
         # If still not found, try the advanced scanning approach
         if df_processed is None:
-            # Look for month names in the actual data cells
-            for row_idx in range(min(20, len(df))):
-                row_data = df.iloc[row_idx].astype(str).str.lower()
-                month_count = 0
-                for cell in row_data:
-                    if any(month in cell for month in ["april", "may", "june", "july", "august", "september", "october", "november", "december", "january", "february", "march"]):
-                        month_count += 1
-
-                if month_count >= 8:  # Found a row with multiple month names
-                    try:
-                        # Use this row as header
-                        if uploaded.name.endswith('.xls'):
-                            df_test = pd.read_excel(uploaded, sheet_name=sheet_name, header=row_idx)
-                        else:
-                            df_test = pd.read_excel(uploaded, sheet_name=sheet_name, header=row_idx, engine="openpyxl")
-
-                        # Verify month columns
-                        month_cols_found = []
-                        expected_months = ["April", "May", "June", "July", "August", "September", "October", "November", "December", "January", "February", "March"]
-                        for col in df_test.columns:
-                            if col in expected_months:
-                                month_cols_found.append(col)
-
-                        if len(month_cols_found) >= 8:
-                            df_processed = df_test
-                            break
-                    except:
-                        continue
+            # Look for month names in the actual data cells of the first 20 rows
+            month_counts = df.iloc[:20].astype(str).apply(lambda col: col.str.contains(MONTH_RE)).sum(axis=1)
+            for row_idx in np.flatnonzero(month_counts.to_numpy() >= 8):  # Rows with multiple month names
+                try:
+                    # Use this row as header
+                    df_test = frame_with_header(df, row_idx)
+
+                    # Verify month columns
+                    month_cols_found = MONTH_COLS.intersection(df_test.columns)
+
+                    if len(month_cols_found) >= 8:
+                        df_processed = df_test
+                        break
+                except:
+                    continue
 
         if df_processed is None:
             continue
@@ -1200,6 +989,10 @@ if uploaded is not None:
     long_all["Date"] = pd.to_datetime(long_all["Date"])
     long_all = long_all.dropna(subset=["Date"])
     long_all = long_all.sort_values(["Area","Date"])
+    # Repeated labels are stored as categories, month numbers as int8
+    for col in ("Area", "State", "FY", "MonthName", "SourceSheet"):
+        long_all[col] = long_all[col].astype("category")
+    long_all["Month"] = long_all["Month"].astype("int8")
     # Remove completely null/zero sales rows
     # (we keep zeros; drop NaN handled already)
 
@@ -1239,9 +1032,9 @@ if uploaded is not None:
     if aggregate_level == "All Areas":
         long_all["GroupKey"] = "All"
     elif aggregate_level == "State+Area" and "State" in long_all.columns and long_all["State"].notna().any():
-        long_all["GroupKey"] = long_all["State"].fillna("NA") + " - " + long_all["Area"].fillna("NA")
+        long_all["GroupKey"] = long_all["State"].astype(object).fillna("NA") + " - " + long_all["Area"].astype(object).fillna("NA")
     else:
-        long_all["GroupKey"] = long_all["Area"].fillna("Unspecified")
+        long_all["GroupKey"] = long_all["Area"].astype(object).fillna("Unspecified")
 
     # Filter to selected areas when applicable
     if aggregate_level != "All Areas":
@@ -1251,29 +1044,15 @@ if uploaded is not None:
     grp = long_all.groupby(["GroupKey","Date"], as_index=False)["Sales"].sum()
 
     # Convert sales to lakhs for display
-    grp["Sales_Lakhs"] = grp["Sales"].apply(convert_to_lakhs)
+    grp["Sales_Lakhs"] = convert_to_lakhs(grp["Sales"])
 
 
 
     # Forecast per group
-    all_fc = {}
-    for g, gdf in grp.groupby("GroupKey"):
-        ts = gdf.set_index("Date")["Sales_Lakhs"].asfreq("MS")
-        # Fill missing months with 0 (or you may prefer NaN + interpolation)
-        if ts.isna().any():
-            # forward fill for short gaps else zeros
-            ts = ts.ffill().fillna(0.0)
-        fc, model = fit_forecast(ts, horizon)
-        df_fc = pd.DataFrame({"Date": fc.index, "Forecast": fc.values})
-        all_fc[g] = df_fc
+    all_fc = forecast_groups(grp, horizon)
 
     # Combine forecasts for display
-    fc_disp = []
-    for g, df_fc in all_fc.items():
-        tmp = df_fc.copy()
-        tmp.insert(0, "Group", g)
-        fc_disp.append(tmp)
-    fc_disp = pd.concat(fc_disp, ignore_index=True)
+    fc_disp = pd.concat(all_fc, names=["Group", None]).reset_index(level="Group").reset_index(drop=True)
 
 
 
@@ -1298,34 +1077,21 @@ if uploaded is not None:
             'WAYANAD', 'THALASSERY', 'KANNUR', 'KASARGOD'
         ]
 
-        next_targets = []
-        territory_targets = []
-
-        for g, df_fc in all_fc.items():
-            row = df_fc.iloc[0]
-            target_value = float(row["Forecast"])
-
-            # Check if this is one of our Kerala territories
-            is_kerala_territory = g in kerala_territories_display
-
-            target_data = {
-                "Area/Region": g,
-                "Target_Month": row["Date"].strftime("%b %Y"),
-                "Sales_Target": format_lakhs(target_value),
-                "Target_Value": target_value,
-                "Target_Value_Lakhs": target_value,
-                "Is_Kerala_Territory": is_kerala_territory
-            }
-
-            next_targets.append(target_data)
-            if is_kerala_territory:
-                territory_targets.append(target_data)
-
-        targets_df = pd.DataFrame(next_targets)
-        if len(targets_df) > 0:
-            targets_df = targets_df.sort_values("Target_Value", ascending=False)
-
-        territory_df = pd.DataFrame(territory_targets)
+        # First forecast month of every group
+        first_fc = pd.concat(all_fc, names=["Area/Region", "Step"]).xs(0, level="Step")
+        target_values = first_fc["Forecast"].astype(float)
+        next_targets = pd.DataFrame({
+            "Area/Region": first_fc.index,
+            "Target_Month": first_fc["Date"].dt.strftime("%b %Y"),
+            "Sales_Target": target_values.map(format_lakhs),
+            "Target_Value": target_values,
+            "Target_Value_Lakhs": target_values,
+            # Check which are our Kerala territories
+            "Is_Kerala_Territory": first_fc.index.isin(kerala_territories_display)
+        }).reset_index(drop=True)
+
+        targets_df = next_targets.sort_values("Target_Value", ascending=False)
+        territory_df = next_targets[next_targets["Is_Kerala_Territory"]].reset_index(drop=True)
         if len(territory_df) > 0:
             territory_df = territory_df.sort_values("Target_Value", ascending=False)
 
@@ -1347,7 +1113,7 @@ if uploaded is not None:
                 # Territory summary
                 territory_total = territory_df["Target_Value"].sum()
                 territory_avg = territory_df["Target_Value"].mean()
-                top_territory = territory_df.iloc[0]["Area/Region"] if len(territory_df) > 0 else "N/A"
+                top_territory = territory_df.loc[territory_df["Target_Value"].idxmax(), "Area/Region"] if len(territory_df) > 0 else "N/A"
 
                 st.metric("Total Territory Target", format_lakhs(territory_total))
                 st.metric("Average per Territory", format_lakhs(territory_avg))
@@ -1403,7 +1169,7 @@ if uploaded is not None:
         # Summary statistics
         total_target = targets_df["Target_Value"].sum()
         avg_target = targets_df["Target_Value"].mean()
-        top_area = targets_df.iloc[0]["Area/Region"]
+        top_area = targets_df.loc[targets_df["Target_Value"].idxmax(), "Area/Region"]
 
         st.markdown("### 📋 Target Summary")
         col1, col2, col3 = st.columns(3)